@@ -6,10 +6,20 @@ import glob
 from os import environ
 environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
 
+import pygame
+
 from vm import Chip8
+from recorder import Recorder
+from sharedstate import SharedState
+from quirks import (
+    Quirks,
+    parse_overrides,
+)
 from peripherals import (
     Display,
     Keyboard,
+    Speaker,
+    NullSpeaker,
 )
 
 roms = []
@@ -20,10 +30,45 @@ rom_options = ', '.join('{}. {}'.format(n, path.split('/')[-1]) for n, path in e
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(usage='make ROM=[rom]')
     parser.add_argument('rom', type=int, help=rom_options)
+    parser.add_argument('--mute', action='store_true', help='disable sound')
+    parser.add_argument('--trace', action='store_true',
+                        help='print every executed instruction')
+    parser.add_argument('--record', metavar='PATH',
+                        help='record to PATH (.gif, otherwise a PNG directory)')
+    parser.add_argument('--shared-memory', metavar='NAME', nargs='?', const='',
+                        help='export the VM state through shared memory')
+    parser.add_argument('--quirk', action='append', metavar='NAME=0|1',
+                        help='override a compatibility quirk ({})'.format(
+                            ', '.join(Quirks._fields)))
     args = parser.parse_args()
     rom = roms[args.rom]
+    try:
+        overrides = parse_overrides(args.quirk)
+    except ValueError as e:
+        parser.error(str(e))
 
     display = Display()
     keyboard = Keyboard()
-    chip8 = Chip8(display, keyboard)
-    chip8.run(rom)
+    speaker = NullSpeaker()
+    if not args.mute:
+        try:
+            speaker = Speaker()
+        except pygame.error:
+            # No audio device available (e.g. headless or remote session)
+            pass
+    chip8 = Chip8(display, keyboard, speaker)
+    chip8.trace = args.trace
+    shared = None
+    if args.shared_memory is not None:
+        shared = SharedState(args.shared_memory or None)
+        shared.attach(chip8)
+        print('shared memory: {}'.format(shared.name))
+    if args.record:
+        chip8.recorder = Recorder(args.record)
+    try:
+        chip8.run(rom, overrides)
+    finally:
+        if chip8.recorder is not None:
+            chip8.recorder.close()
+        if shared is not None:
+            shared.close()
@@ -6,6 +6,7 @@ import pygame
 
 CLOCK_SPEED = 1 / 600
 TIMER_SPEED = 1 / 60
+CYCLES_PER_FRAME = round(TIMER_SPEED / CLOCK_SPEED)
 
 MEMORY_SIZE = 4096
 V_REGISTER_SIZE = 16
@@ -43,3 +44,9 @@ COLORS = {
     0: pygame.Color(0, 0, 0, 255),
     1: pygame.Color(255, 119, 168, 255),
 }
+
+# SOUND
+
+SAMPLE_RATE = 44100
+BEEP_FREQUENCY = 440
+BEEP_VOLUME = 0.2
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+import argparse
+from collections import namedtuple
+import json
+import multiprocessing
+import os
+import random
+import time
+
+from config import (
+    MEMORY_SIZE,
+    PC_START,
+)
+from peripherals import (
+    HeadlessDisplay,
+    VirtualKeyboard,
+)
+from vm import Chip8
+
+FUZZ_FRAMES = 30
+BATCH_SIZE = 64
+KEYS = [None] + list(range(16))
+NO_COVERAGE = bytes(MEMORY_SIZE)
+
+# patches: ((address, byte), ...) applied on top of the loaded ROM
+# keys:    the key held down during each frame, None for no key
+# seed:    seed for RND
+Candidate = namedtuple('Candidate', ['patches', 'keys', 'seed'])
+Crash = namedtuple('Crash', ['error', 'message', 'pc', 'frame'])
+Result = namedtuple('Result', ['candidate', 'new_pcs', 'crash'])
+
+
+class Target:
+    # Runs candidates on one VM, restoring the post-load snapshot each time
+    # instead of going through reset() and load() again.
+
+    def __init__(self, rom_data):
+        self.keyboard = VirtualKeyboard()
+        self.vm = Chip8(HeadlessDisplay(), self.keyboard)
+        self.vm.load(rom_data)
+        self.vm.coverage = bytearray(MEMORY_SIZE)
+        self.loaded = self.vm.snapshot()
+        self.seen = 0
+
+    def run(self, candidate):
+        vm = self.vm
+        vm.restore(self.loaded)
+        vm.coverage[:] = NO_COVERAGE
+        for address, byte in candidate.patches:
+            vm.memory[address] = byte
+        random.seed(candidate.seed)
+        for frame, key in enumerate(candidate.keys):
+            self.keyboard.key = key
+            try:
+                vm.run_frame()
+            except Exception as e:
+                return Crash(type(e).__name__, str(e), vm.pc, frame)
+        return None
+
+    def new_coverage(self):
+        # Coverage is compared as one big integer, which is much cheaper than
+        # walking the 4096 entries for every execution.
+        coverage = int.from_bytes(self.vm.coverage, 'big')
+        new = coverage & ~self.seen
+        if not new:
+            return ()
+        self.seen |= new
+        return tuple(pc for pc, hit in enumerate(new.to_bytes(MEMORY_SIZE, 'big'))
+                     if hit)
+
+
+def run_batch(target, candidates):
+    results = []
+    for candidate in candidates:
+        crash = target.run(candidate)
+        new_pcs = target.new_coverage()
+        if new_pcs or crash is not None:
+            results.append(Result(candidate, new_pcs, crash))
+    return results
+
+
+# Worker pool plumbing: every worker builds its Target once
+
+worker_target = None
+
+
+def init_worker(rom_data):
+    global worker_target
+    worker_target = Target(rom_data)
+
+
+def run_worker_batch(candidates):
+    return run_batch(worker_target, candidates)
+
+
+class Fuzzer:
+
+    def __init__(self, rom_data, frames=FUZZ_FRAMES, workers=None, out=None,
+                 seed=None):
+        self.rom_data = bytes(rom_data)
+        self.frames = frames
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.out = out
+        self.rng = random.Random(seed)
+        self.target = Target(self.rom_data)
+        self.corpus = [Candidate((), (None,) * frames, 0)]
+        self.coverage = set()
+        self.crashes = {}
+        self.execs = 0
+        self.elapsed = 0.0
+
+    # Mutation
+
+    def rom_byte(self, patches, address):
+        return patches.get(address, self.rom_data[address - PC_START])
+
+    def mutate(self, candidate):
+        rng = self.rng
+        patches = dict(candidate.patches)
+        keys = list(candidate.keys)
+        seed = candidate.seed
+        for _ in range(rng.randint(1, 4)):
+            choice = rng.randrange(5)
+            address = PC_START + rng.randrange(len(self.rom_data))
+            if choice == 0:
+                patches[address] = rng.randrange(0x100)
+            elif choice == 1:
+                patches[address] = self.rom_byte(patches, address) ^ (1 << rng.randrange(8))
+            elif choice == 2:
+                keys[rng.randrange(len(keys))] = rng.choice(KEYS)
+            elif choice == 3:
+                # Hold one key for a stretch of frames
+                start = rng.randrange(len(keys))
+                key = rng.choice(KEYS)
+                for frame in range(start, min(len(keys), start + rng.randint(1, 8))):
+                    keys[frame] = key
+            else:
+                seed = rng.randrange(1 << 32)
+        patches = tuple(sorted((address, byte) for address, byte in patches.items()
+                               if byte != self.rom_data[address - PC_START]))
+        return Candidate(patches, tuple(keys), seed)
+
+    def batch(self):
+        return [self.mutate(self.rng.choice(self.corpus)) for _ in range(BATCH_SIZE)]
+
+    # Results
+
+    def handle(self, results):
+        for result in results:
+            new_pcs = set(result.new_pcs) - self.coverage
+            if new_pcs:
+                self.coverage |= new_pcs
+                self.corpus.append(result.candidate)
+            crash = result.crash
+            if crash is not None and (crash.error, crash.pc) not in self.crashes:
+                minimized = self.minimize(result.candidate, crash)
+                self.crashes[crash.error, crash.pc] = minimized
+                if self.out is not None:
+                    self.save(minimized, crash)
+
+    def reproduces(self, candidate, crash):
+        found = self.target.run(candidate)
+        return found is not None and (found.error, found.pc) == (crash.error, crash.pc)
+
+    def minimize(self, candidate, crash):
+        # Nothing after the crashing frame matters
+        candidate = candidate._replace(keys=candidate.keys[:crash.frame + 1])
+        patches = list(candidate.patches)
+        i = 0
+        while i < len(patches):
+            trial = candidate._replace(patches=tuple(patches[:i] + patches[i + 1:]))
+            if self.reproduces(trial, crash):
+                patches.pop(i)
+                candidate = trial
+            else:
+                i += 1
+        keys = list(candidate.keys)
+        for frame, key in enumerate(keys):
+            if key is None:
+                continue
+            keys[frame] = None
+            trial = candidate._replace(keys=tuple(keys))
+            if self.reproduces(trial, crash):
+                candidate = trial
+            else:
+                keys[frame] = key
+        return candidate
+
+    def save(self, candidate, crash):
+        os.makedirs(self.out, exist_ok=True)
+        name = os.path.join(self.out, '{}-{}'.format(crash.error, hex(crash.pc)))
+        rom_data = bytearray(self.rom_data)
+        for address, byte in candidate.patches:
+            rom_data[address - PC_START] = byte
+        with open(name + '.ch8', 'wb') as f:
+            f.write(rom_data)
+        with open(name + '.json', 'w') as f:
+            json.dump({
+                'error': crash.error,
+                'message': crash.message,
+                'pc': crash.pc,
+                'keys': candidate.keys,
+                'seed': candidate.seed,
+            }, f)
+
+    # Campaign
+
+    def run(self, seconds=None, execs=None):
+        start = time.perf_counter()
+
+        def done():
+            if execs is not None and self.execs >= execs:
+                return True
+            return seconds is not None and time.perf_counter() - start >= seconds
+
+        if self.workers == 0:
+            while not done():
+                self.handle(run_batch(self.target, self.batch()))
+                self.execs += BATCH_SIZE
+        else:
+            with multiprocessing.Pool(self.workers, init_worker,
+                                      (self.rom_data,)) as pool:
+                while not done():
+                    batches = [self.batch() for _ in range(self.workers * 2)]
+                    for results in pool.imap_unordered(run_worker_batch, batches):
+                        self.handle(results)
+                        self.execs += BATCH_SIZE
+        self.elapsed += time.perf_counter() - start
+
+    def execs_per_second(self):
+        return self.execs / self.elapsed if self.elapsed else 0.0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='fuzz a ROM and the interpreter')
+    parser.add_argument('rom')
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--frames', type=int, default=FUZZ_FRAMES)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='crashes')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.rom, 'rb') as f:
+        fuzzer = Fuzzer(f.read(), args.frames, args.workers, args.out, args.seed)
+    fuzzer.run(seconds=args.seconds)
+    print('execs: {} ({:.0f}/s)'.format(fuzzer.execs, fuzzer.execs_per_second()))
+    print('coverage: {} PCs, corpus: {}'.format(len(fuzzer.coverage), len(fuzzer.corpus)))
+    for (error, pc), candidate in sorted(fuzzer.crashes.items()):
+        print('crash: {} at {} ({} patches)'.format(error, hex(pc), len(candidate.patches)))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+from collections import (
+    deque,
+    namedtuple,
+)
+import time
+
+from config import (
+    CYCLES_PER_FRAME,
+    TIMER_SPEED,
+)
+from peripherals import (
+    HeadlessDisplay,
+    VirtualKeyboard,
+)
+from quirks import (
+    lookup,
+    rom_hash,
+)
+from vm import Chip8
+
+
+SessionStats = namedtuple('SessionStats', [
+    'id',
+    'digest',
+    'frames',
+    'instructions',
+    'cpu_time',
+    'error',
+])
+
+
+class Rom:
+    # Read-only data shared by every session running the same ROM image.
+
+    def __init__(self, data):
+        self.data = bytes(data)
+        self.digest = rom_hash(self.data)
+        self.quirks = lookup(self.data)
+
+
+class Session:
+
+    def __init__(self, session_id, rom, quirks=None, budget=CYCLES_PER_FRAME):
+        self.id = session_id
+        self.rom = rom
+        self.budget = budget
+        self.keyboard = VirtualKeyboard()
+        self.vm = Chip8(HeadlessDisplay(), self.keyboard)
+        self.vm.load(rom.data, quirks if quirks is not None else rom.quirks)
+        self.frames = 0
+        self.instructions = 0
+        self.cpu_time = 0.0
+        self.error = None
+
+    def run_slice(self):
+        start = time.thread_time()
+        try:
+            self.vm.run_frame(self.budget)
+        except Exception as e:
+            self.error = e
+        else:
+            self.frames += 1
+            self.instructions += self.budget
+        self.cpu_time += time.thread_time() - start
+
+    def stats(self):
+        return SessionStats(self.id, self.rom.digest, self.frames,
+                            self.instructions, self.cpu_time, self.error)
+
+
+class Host:
+
+    def __init__(self):
+        self.roms = {}
+        self.sessions = deque()
+        self.closed = []
+        self.next_id = 0
+        self.overruns = 0
+
+    def rom(self, rom_data):
+        digest = rom_hash(rom_data)
+        if digest not in self.roms:
+            self.roms[digest] = Rom(rom_data)
+        return self.roms[digest]
+
+    def open(self, rom_data, quirks=None, budget=CYCLES_PER_FRAME):
+        session = Session(self.next_id, self.rom(rom_data), quirks, budget)
+        self.next_id += 1
+        self.sessions.append(session)
+        return session
+
+    def close(self, session):
+        self.sessions.remove(session)
+        self.closed.append(session)
+
+    def run_frame(self):
+        # Every session gets exactly one slice per frame. The session that goes
+        # first rotates so that none of them is always served last.
+        for session in list(self.sessions):
+            session.run_slice()
+            if session.error is not None:
+                self.close(session)
+        self.sessions.rotate(-1)
+
+    def run(self, frames, realtime=True):
+        deadline = time.perf_counter()
+        for _ in range(frames):
+            self.run_frame()
+            if not realtime:
+                continue
+            deadline += TIMER_SPEED
+            remaining = deadline - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            else:
+                self.overruns += 1
+                deadline = time.perf_counter()
+
+    def stats(self):
+        return [session.stats() for session in self.sessions]
+
+    def capacity(self):
+        # Estimated number of sessions one core can serve in real time, from
+        # the CPU time the current sessions have used per frame so far.
+        frames = sum(session.frames for session in self.sessions)
+        cpu_time = sum(session.cpu_time for session in self.sessions)
+        if not frames or not cpu_time:
+            return None
+        return int(TIMER_SPEED / (cpu_time / frames))
@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
 
+from array import array
+from functools import lru_cache
+
 import pygame
 
 from config import (
@@ -8,16 +11,18 @@ from config import (
     DISPLAY_HEIGHT,
     SCALE_FACTOR,
     COLORS,
+    SAMPLE_RATE,
+    BEEP_FREQUENCY,
+    BEEP_VOLUME,
 )
 
 
-class Display:
+BLANK_FRAME = bytes(DISPLAY_WIDTH * DISPLAY_HEIGHT)
+
+
+class HeadlessDisplay:
 
     def __init__(self):
-        pygame.init()
-        pygame.display.set_caption(TITLE)
-        size = (DISPLAY_WIDTH * SCALE_FACTOR, DISPLAY_HEIGHT * SCALE_FACTOR)
-        self.surface = pygame.display.set_mode(size)
         self.frameBuffer = bytearray(DISPLAY_WIDTH * DISPLAY_HEIGHT)
 
     def __str__(self):
@@ -35,10 +40,19 @@ class Display:
                 erased = self.write_to_buffer(x + xx, y + yy, bit) or erased
         return erased
 
+    def draw_sprite_wrapped(self, x, y, data):
+        erased = False
+        for yy, byte in enumerate(data):
+            for xx, bit in enumerate(bits(byte)):
+                erased = self.write_to_buffer(
+                    (x + xx) % DISPLAY_WIDTH,
+                    (y + yy) % DISPLAY_HEIGHT,
+                    bit) or erased
+        return erased
+
     def write_to_buffer(self, x, y, color_code):
         if x >= DISPLAY_WIDTH or y >= DISPLAY_HEIGHT:
             return
-        # x, y = x % DISPLAY_WIDTH, y % DISPLAY_HEIGHT
         prev_filled = self.filled(x, y)
         cur_filled = color_code ^ prev_filled
         self.frameBuffer[x + y * DISPLAY_WIDTH] = cur_filled
@@ -49,7 +63,24 @@ class Display:
         return self.frameBuffer[x + y * DISPLAY_WIDTH] == 1
 
     def clear(self):
-        self.frameBuffer = bytearray(DISPLAY_WIDTH * DISPLAY_HEIGHT)
+        # Cleared in place: the buffer may be shared with other processes
+        self.frameBuffer[:] = BLANK_FRAME
+
+    def update(self):
+        pass
+
+
+class Display(HeadlessDisplay):
+
+    def __init__(self):
+        super().__init__()
+        pygame.init()
+        pygame.display.set_caption(TITLE)
+        size = (DISPLAY_WIDTH * SCALE_FACTOR, DISPLAY_HEIGHT * SCALE_FACTOR)
+        self.surface = pygame.display.set_mode(size)
+
+    def clear(self):
+        super().clear()
         self.surface.fill(COLORS[0])
 
     def update(self):
@@ -62,9 +93,40 @@ class Display:
                 pygame.draw.rect(self.surface, COLORS[color], rect)
         pygame.display.update()
 
-    def playBeep(self):
-        #TODO
-        print('beep')
+
+class Speaker:
+
+    def __init__(self):
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(frequency=SAMPLE_RATE, size=-16, channels=1)
+        sample_rate, _, channels = pygame.mixer.get_init()
+        self.beep = pygame.mixer.Sound(
+            buffer=tone(BEEP_FREQUENCY, BEEP_VOLUME, sample_rate, channels))
+        self.playing = False
+
+    def play(self):
+        # Called on every timer tick while the sound timer is active, so only
+        # the first call actually starts the (looping) beep.
+        if not self.playing:
+            self.beep.play(loops=-1)
+            self.playing = True
+
+    def stop(self):
+        if self.playing:
+            self.beep.stop()
+            self.playing = False
+
+
+class NullSpeaker:
+
+    def __init__(self):
+        self.playing = False
+
+    def play(self):
+        self.playing = True
+
+    def stop(self):
+        self.playing = False
 
 
 class Keyboard():
@@ -107,5 +169,33 @@ class Keyboard():
             return None
 
 
+class VirtualKeyboard:
+
+    def __init__(self):
+        self.key = None
+
+    def press(self, key):
+        self.key = key
+
+    def release(self):
+        self.key = None
+
+    def get_input(self):
+        return self.key
+
+
+@lru_cache(maxsize=None)
+def tone(frequency, volume, sample_rate, channels):
+    # One period of a square wave as signed 16-bit samples, looped by the
+    # mixer for as long as the sound timer is active.
+    period = max(2, round(sample_rate / frequency))
+    amplitude = int(volume * 0x7FFF)
+    samples = array('h')
+    for t in range(period):
+        sample = amplitude if t < period // 2 else -amplitude
+        samples.extend([sample] * channels)
+    return samples.tobytes()
+
+
 def bits(n):
     return (int(i) for i in '{:08b}'.format(n))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+from collections import namedtuple
+import hashlib
+
+
+# shift_vy:     8xy6/8xyE shift Vy into Vx instead of shifting Vx in place
+# load_store_i: Fx55/Fx65 leave I pointing past the last register copied
+# wrap_sprites: Dxyn wraps sprites around the screen edges instead of
+#               clipping them
+Quirks = namedtuple('Quirks', ['shift_vy', 'load_store_i', 'wrap_sprites'])
+
+DEFAULT_QUIRKS = Quirks(
+    shift_vy=False,
+    load_store_i=False,
+    wrap_sprites=True,
+)
+
+# Per-ROM deviations from DEFAULT_QUIRKS, keyed by the SHA-1 of the ROM image
+ROM_QUIRKS = {
+    # BLITZ draws the bottom of its buildings past the last row
+    '6f6509f38220e057a7e32ebb22dd353c1078e3e7': {'wrap_sprites': False},
+}
+
+Handlers = namedtuple('Handlers', [
+    'shift_right',
+    'shift_left',
+    'store_registers',
+    'load_registers',
+])
+
+
+def rom_hash(rom_data):
+    return hashlib.sha1(bytes(rom_data)).hexdigest()
+
+
+def lookup(rom_data, overrides=None):
+    quirks = DEFAULT_QUIRKS._replace(**ROM_QUIRKS.get(rom_hash(rom_data), {}))
+    if overrides:
+        quirks = quirks._replace(**overrides)
+    return quirks
+
+
+def parse_overrides(args):
+    # ['shift_vy=1', 'wrap_sprites=0'] -> {'shift_vy': True, ...}
+    overrides = {}
+    for arg in args or []:
+        name, _, value = arg.partition('=')
+        if name not in Quirks._fields or value not in ('0', '1'):
+            raise ValueError('invalid quirk: {}'.format(arg))
+        overrides[name] = value == '1'
+    return overrides
+
+
+def resolve(quirks):
+    # Pick the handler variants once so that the interpreter never has to look
+    # at the quirk flags while executing.
+    return Handlers(
+        shift_right=shift_right_vy if quirks.shift_vy else shift_right_vx,
+        shift_left=shift_left_vy if quirks.shift_vy else shift_left_vx,
+        store_registers=store_registers_increment if quirks.load_store_i
+        else store_registers,
+        load_registers=load_registers_increment if quirks.load_store_i
+        else load_registers,
+    )
+
+
+# Handlers
+
+def shift_right_vx(v, x, y):
+    v[0xF] = v[x] & 0x01
+    v[x] >>= 1
+
+
+def shift_right_vy(v, x, y):
+    v[0xF] = v[y] & 0x01
+    v[x] = v[y] >> 1
+
+
+def shift_left_vx(v, x, y):
+    v[0xF] = v[x] >> 7
+    v[x] = (v[x] << 1) & 0xFF
+
+
+def shift_left_vy(v, x, y):
+    v[0xF] = v[y] >> 7
+    v[x] = (v[y] << 1) & 0xFF
+
+
+def store_registers(memory, v, i, x):
+    check_range(memory, i, x + 1)
+    memory[i:i + x + 1] = v[:x + 1]
+    return i
+
+
+def store_registers_increment(memory, v, i, x):
+    check_range(memory, i, x + 1)
+    memory[i:i + x + 1] = v[:x + 1]
+    return i + x + 1
+
+
+def load_registers(memory, v, i, x):
+    check_range(memory, i, x + 1)
+    v[:x + 1] = memory[i:i + x + 1]
+    return i
+
+
+def load_registers_increment(memory, v, i, x):
+    check_range(memory, i, x + 1)
+    v[:x + 1] = memory[i:i + x + 1]
+    return i + x + 1
+
+
+def check_range(memory, i, n):
+    # Slice assignment would silently resize a bytearray, so reject accesses
+    # past the end of memory the way plain indexing would.
+    if i + n > len(memory):
+        raise IndexError('memory access out of range: {}'.format(hex(i + n - 1)))
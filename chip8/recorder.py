@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+import argparse
+import multiprocessing
+import os
+import struct
+import zlib
+
+from config import (
+    TIMER_SPEED,
+    DISPLAY_WIDTH,
+    DISPLAY_HEIGHT,
+    COLORS,
+)
+from peripherals import (
+    HeadlessDisplay,
+    VirtualKeyboard,
+)
+from vm import Chip8
+
+RECORD_SCALE = 4
+
+
+class Recorder:
+    # Captures the framebuffer at every presented frame. Identical consecutive
+    # frames are merged into one longer frame, and encoding happens in a
+    # separate process so that it never competes with the emulator.
+
+    def __init__(self, path, fmt=None, scale=RECORD_SCALE):
+        if fmt is None:
+            fmt = 'gif' if path.endswith('.gif') else 'png'
+        self.queue = multiprocessing.Queue()
+        self.worker = multiprocessing.Process(
+            target=encode, args=(self.queue, path, fmt, scale), daemon=True)
+        self.worker.start()
+        self.last = None
+        self.duration = 0
+        self.frames = 0
+
+    def capture(self, framebuffer):
+        self.frames += 1
+        if self.last is not None and self.last == framebuffer:
+            self.duration += 1
+            return
+        self.flush()
+        self.last = bytes(framebuffer)
+        self.duration = 1
+
+    def flush(self):
+        if self.last is not None:
+            self.queue.put((self.last, self.duration))
+
+    def close(self):
+        self.flush()
+        self.last = None
+        self.queue.put(None)
+        self.worker.join()
+
+
+def encode(queue, path, fmt, scale):
+    writer = GifWriter(path, scale) if fmt == 'gif' else PngWriter(path, scale)
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        writer.write(*item)
+    writer.close()
+
+
+def scale_frame(framebuffer, scale):
+    rows = bytearray()
+    for y in range(DISPLAY_HEIGHT):
+        row = framebuffer[y * DISPLAY_WIDTH:(y + 1) * DISPLAY_WIDTH]
+        row = bytes(pixel for pixel in row for _ in range(scale))
+        rows += row * scale
+    return rows
+
+
+class GifWriter:
+
+    def __init__(self, path, scale):
+        self.f = open(path, 'wb')
+        self.scale = scale
+        self.width = DISPLAY_WIDTH * scale
+        self.height = DISPLAY_HEIGHT * scale
+        self.elapsed = 0
+        self.written = 0
+        palette = b''.join(bytes([COLORS[i].r, COLORS[i].g, COLORS[i].b])
+                           for i in (0, 1))
+        self.f.write(b'GIF89a')
+        # Logical screen with a 2-entry global color table
+        self.f.write(struct.pack('<HHBBB', self.width, self.height, 0x80, 0, 0))
+        self.f.write(palette)
+        # Loop forever
+        self.f.write(b'\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00')
+
+    def write(self, framebuffer, duration):
+        # Delays are in 1/100s, so keep track of the total to avoid drift
+        self.elapsed += duration
+        delay = round(self.elapsed * TIMER_SPEED * 100) - self.written
+        self.written += delay
+        self.f.write(struct.pack('<BBBBHBB', 0x21, 0xF9, 4, 0, delay, 0, 0))
+        self.f.write(struct.pack('<BHHHHB', 0x2C, 0, 0, self.width, self.height, 0))
+        data = lzw_encode(scale_frame(framebuffer, self.scale), 2)
+        self.f.write(b'\x02')
+        for i in range(0, len(data), 255):
+            block = data[i:i + 255]
+            self.f.write(bytes([len(block)]) + block)
+        self.f.write(b'\x00')
+
+    def close(self):
+        self.f.write(b'\x3B')
+        self.f.close()
+
+
+def lzw_encode(pixels, min_code_size):
+    clear = 1 << min_code_size
+    end = clear + 1
+    out = bytearray()
+    buf = 0
+    nbits = 0
+
+    def reset():
+        return {}, end + 1, min_code_size + 1
+
+    table, next_code, code_size = reset()
+
+    def write(code, size):
+        nonlocal buf, nbits
+        buf |= code << nbits
+        nbits += size
+        while nbits >= 8:
+            out.append(buf & 0xFF)
+            buf >>= 8
+            nbits -= 8
+
+    write(clear, code_size)
+    prefix = pixels[0]
+    for pixel in pixels[1:]:
+        key = prefix << 8 | pixel
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        write(prefix, code_size)
+        if next_code == 4096:
+            write(clear, code_size)
+            table, next_code, code_size = reset()
+        else:
+            if next_code == 1 << code_size:
+                code_size += 1
+            table[key] = next_code
+            next_code += 1
+        prefix = pixel
+    write(prefix, code_size)
+    write(end, code_size)
+    if nbits:
+        out.append(buf & 0xFF)
+    return bytes(out)
+
+
+class PngWriter:
+    # One PNG per distinct frame plus frames.txt listing each file with its
+    # duration in 60Hz frames.
+
+    def __init__(self, path, scale):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.scale = scale
+        self.index = 0
+        self.listing = open(os.path.join(path, 'frames.txt'), 'w')
+
+    def write(self, framebuffer, duration):
+        name = 'frame_{:05d}.png'.format(self.index)
+        with open(os.path.join(self.path, name), 'wb') as f:
+            f.write(png(scale_frame(framebuffer, self.scale),
+                        DISPLAY_WIDTH * self.scale,
+                        DISPLAY_HEIGHT * self.scale))
+        self.listing.write('{} {}\n'.format(name, duration))
+        self.index += 1
+
+    def close(self):
+        self.listing.close()
+
+
+def png(pixels, width, height):
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data)))
+
+    palette = b''.join(bytes([COLORS[i].r, COLORS[i].g, COLORS[i].b])
+                       for i in (0, 1))
+    # 8-bit indexed color, each row prefixed with filter type 0
+    raw = b''.join(b'\x00' + pixels[y * width:(y + 1) * width]
+                   for y in range(height))
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)) +
+            chunk(b'PLTE', palette) +
+            chunk(b'IDAT', zlib.compress(raw)) +
+            chunk(b'IEND', b''))
+
+
+def record(rom, path, frames, fmt=None, scale=RECORD_SCALE):
+    # Headless recording of the first `frames` frames of a ROM
+    chip8 = Chip8(HeadlessDisplay(), VirtualKeyboard())
+    chip8.load(chip8.read_rom(rom))
+    recorder = Recorder(path, fmt, scale)
+    chip8.recorder = recorder
+    try:
+        for _ in range(frames):
+            chip8.run_frame()
+            chip8.present()
+    finally:
+        recorder.close()
+        chip8.recorder = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='record ROMs without a window')
+    parser.add_argument('roms', nargs='+')
+    parser.add_argument('--out', default='recordings')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--format', choices=['gif', 'png'], default='gif')
+    parser.add_argument('--scale', type=int, default=RECORD_SCALE)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for rom in args.roms:
+        name = os.path.basename(rom)
+        if args.format == 'gif':
+            name += '.gif'
+        path = os.path.join(args.out, name)
+        record(rom, path, args.frames, args.format, args.scale)
+        print(path)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+from collections import namedtuple
+from multiprocessing import (
+    resource_tracker,
+    shared_memory,
+)
+import struct
+import time
+
+from config import (
+    MEMORY_SIZE,
+    V_REGISTER_SIZE,
+    DISPLAY_WIDTH,
+    DISPLAY_HEIGHT,
+)
+
+# Layout of the shared block:
+#
+#   HEADER       seq (u64), pc (u16), i (u16), delay timer (u8),
+#                sound timer (u8), padding
+#   V            V0-VF
+#   MEMORY       4KB of VM memory
+#   FRAMEBUFFER  DISPLAY_WIDTH * DISPLAY_HEIGHT bytes, one per pixel
+#
+# seq is a seqlock counter: it is odd while the VM is running a frame and
+# even once the frame is complete, so seq // 2 is the number of finished
+# frames. Readers copy what they need and retry if seq was odd or changed.
+HEADER = struct.Struct('<QHHBB2x')
+V_OFFSET = HEADER.size
+MEMORY_OFFSET = V_OFFSET + V_REGISTER_SIZE
+FRAMEBUFFER_OFFSET = MEMORY_OFFSET + MEMORY_SIZE
+FRAMEBUFFER_SIZE = DISPLAY_WIDTH * DISPLAY_HEIGHT
+SIZE = FRAMEBUFFER_OFFSET + FRAMEBUFFER_SIZE
+
+SEQ = struct.Struct('<Q')
+
+Frame = namedtuple('Frame', [
+    'frame',
+    'pc',
+    'i',
+    'delay_timer',
+    'sound_timer',
+    'v',
+    'memory',
+    'framebuffer',
+])
+
+
+def views(buf):
+    return (buf[V_OFFSET:MEMORY_OFFSET],
+            buf[MEMORY_OFFSET:FRAMEBUFFER_OFFSET],
+            buf[FRAMEBUFFER_OFFSET:SIZE])
+
+
+class SharedState:
+    # Owner side: backs a VM's v, memory and framebuffer with shared memory.
+
+    def __init__(self, name=None):
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=SIZE)
+        self.name = self.shm.name
+        # The block is unlinked explicitly in close(). It is kept out of the
+        # resource tracker meanwhile, because a reader in a forked child shares
+        # this process' tracker and its unregister() would drop our entry.
+        resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.seq = 0
+        self.vm = None
+
+    def attach(self, vm):
+        v, memory, framebuffer = views(self.shm.buf)
+        v[:] = vm.v
+        memory[:] = vm.memory
+        framebuffer[:] = vm.display.frameBuffer
+        vm.v, vm.memory, vm.display.frameBuffer = v, memory, framebuffer
+        vm.shared = self
+        self.vm = vm
+        self.end_write(vm)
+
+    def detach(self):
+        # Move the VM back to private buffers so the block can be released
+        vm = self.vm
+        v, memory, framebuffer = vm.v, vm.memory, vm.display.frameBuffer
+        vm.v, vm.memory = bytearray(v), bytearray(memory)
+        vm.display.frameBuffer = bytearray(framebuffer)
+        vm.shared = None
+        for view in (v, memory, framebuffer):
+            view.release()
+        self.vm = None
+
+    def begin_write(self):
+        self.seq += 1
+        SEQ.pack_into(self.shm.buf, 0, self.seq)
+
+    def end_write(self, vm):
+        self.seq += self.seq % 2
+        HEADER.pack_into(self.shm.buf, 0, self.seq, vm.pc, vm.i,
+                         vm.delay_timer, vm.sound_timer)
+
+    def close(self):
+        if self.vm is not None:
+            self.detach()
+        self.shm.close()
+        # unlink() unregisters the block, so register it again first
+        resource_tracker.register(self.shm._name, 'shared_memory')
+        self.shm.unlink()
+
+
+class SharedStateReader:
+    # Consumer side, usually in another process.
+
+    def __init__(self, name):
+        self.shm = shared_memory.SharedMemory(name=name)
+        # Attaching registers the block with this process' resource tracker,
+        # which would unlink it when this process exits; the owner does that.
+        resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.v, self.memory, self.framebuffer = views(self.shm.buf)
+
+    def seq(self):
+        return SEQ.unpack_from(self.shm.buf, 0)[0]
+
+    def read(self, timeout=1.0):
+        # Copy out one consistent frame. Only the copies are handed out, the
+        # live views (self.v, self.memory, self.framebuffer) can be used
+        # directly together with seq() for zero-copy access.
+        deadline = time.perf_counter() + timeout
+        while True:
+            header = HEADER.unpack_from(self.shm.buf, 0)
+            seq = header[0]
+            if seq % 2 == 0:
+                v = bytes(self.v)
+                memory = bytes(self.memory)
+                framebuffer = bytes(self.framebuffer)
+                if self.seq() == seq:
+                    return Frame(seq // 2, *header[1:], v, memory, framebuffer)
+            if time.perf_counter() > deadline:
+                raise TimeoutError('no consistent frame within {}s'.format(timeout))
+            time.sleep(0)
+
+    def close(self):
+        for view in (self.v, self.memory, self.framebuffer):
+            view.release()
+        self.shm.close()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import os
+
+from chip8.config import PC_START
+from chip8.fuzz import (
+    Candidate,
+    Fuzzer,
+    Target,
+)
+
+# Crashes on an unknown instruction while key 5 is held
+ROM = bytes([
+    0x60, 0x05,  # 200: LD V0, 5
+    0xE0, 0x9E,  # 202: SKP V0
+    0x12, 0x02,  # 204: JP 202
+    0xFF, 0xFF,  # 206: ???
+])
+
+
+def test_target():
+    target = Target(ROM)
+    idle = Candidate((), (None,) * 3, 0)
+    assert target.run(idle) is None
+    assert set(target.new_coverage()) == {0x200, 0x202, 0x204}
+    assert target.new_coverage() == ()
+
+    crash = target.run(Candidate((), (None, 5, None), 0))
+    assert crash.error == 'UnknownInstructionError'
+    assert crash.pc == 0x206
+    assert crash.frame == 1
+
+    # Patches apply on top of the snapshot and don't leak into later runs
+    crash = target.run(Candidate(((PC_START + 2, 0x00),), (None,), 0))
+    assert crash.error == 'NotImplementedError'
+    assert target.run(idle) is None
+
+def test_minimize():
+    fuzzer = Fuzzer(ROM, frames=4, workers=0)
+    candidate = Candidate(((PC_START + 7, 0xFE),), (1, 5, 2, 3), 0)
+    crash = fuzzer.target.run(candidate)
+    minimized = fuzzer.minimize(candidate, crash)
+    assert minimized.patches == ()
+    assert minimized.keys == (None, 5)
+
+def test_fuzz(tmp_path):
+    fuzzer = Fuzzer(ROM, frames=4, workers=0, out=str(tmp_path), seed=1)
+    fuzzer.run(execs=1000)
+    assert {0x200, 0x202, 0x204, 0x206} <= fuzzer.coverage
+    assert ('UnknownInstructionError', 0x206) in fuzzer.crashes
+    assert os.path.exists(str(tmp_path / 'UnknownInstructionError-0x206.ch8'))
+
+def test_fuzz_workers():
+    with open('../roms/PONG', 'rb') as f:
+        fuzzer = Fuzzer(f.read(), frames=10, workers=2, seed=1)
+    fuzzer.run(execs=256)
+    assert fuzzer.execs >= 256
+    assert len(fuzzer.coverage) > 10
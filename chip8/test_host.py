@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+from chip8.config import CYCLES_PER_FRAME
+from chip8.host import Host
+
+
+def read_rom(name):
+    with open('../roms/' + name, 'rb') as f:
+        return f.read()
+
+
+def test_shared_rom():
+    host = Host()
+    a = host.open(read_rom('PONG'))
+    b = host.open(read_rom('PONG'))
+    c = host.open(read_rom('MAZE'))
+    assert a.rom is b.rom
+    assert a.rom is not c.rom
+    assert a.vm.memory is not b.vm.memory
+    assert len(host.roms) == 2
+
+def test_run_frame():
+    host = Host()
+    a = host.open(read_rom('PONG'))
+    b = host.open(read_rom('MAZE'), budget=2 * CYCLES_PER_FRAME)
+    host.run(3, realtime=False)
+    assert [s.frames for s in (a, b)] == [3, 3]
+    assert a.instructions == 3 * CYCLES_PER_FRAME
+    assert b.instructions == 6 * CYCLES_PER_FRAME
+    assert host.capacity() > 0
+
+def test_fairness():
+    host = Host()
+    a = host.open(read_rom('PONG'))
+    b = host.open(read_rom('PONG'))
+    assert list(host.sessions) == [a, b]
+    host.run_frame()
+    assert list(host.sessions) == [b, a]
+
+def test_crashed_session():
+    host = Host()
+    ok = host.open(read_rom('PONG'))
+    bad = host.open(bytes([0xFF, 0xFF]))
+    host.run_frame()
+    assert list(host.sessions) == [ok]
+    assert host.closed == [bad]
+    assert bad.error is not None
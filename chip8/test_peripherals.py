@@ -8,7 +8,11 @@ from chip8.config import (
     SCALE_FACTOR,
     COLORS,
 )
-from chip8.peripherals import Display
+from chip8.peripherals import (
+    Display,
+    NullSpeaker,
+    tone,
+)
 
 display = Display()
 
@@ -26,3 +30,25 @@ def test_draw_sprite():
     sprite = [0xFF, 0xFF]
     assert not display.draw_sprite(0, 0, sprite)
     assert display.draw_sprite(0, 1, sprite)
+
+def test_draw_sprite_wrapped():
+    display.clear()
+    sprite = [0xFF]
+    assert not display.draw_sprite(DISPLAY_WIDTH - 4, 0, sprite)
+    assert not display.filled(0, 0)
+    assert display.draw_sprite_wrapped(DISPLAY_WIDTH - 4, 0, sprite)
+    assert display.filled(0, 0)
+    assert not display.filled(DISPLAY_WIDTH - 1, 0)
+
+def test_tone():
+    buf = tone(440, 0.5, 44100, 1)
+    assert len(buf) == round(44100 / 440) * 2
+    assert tone(440, 0.5, 44100, 1) is buf
+    assert len(tone(440, 0.5, 44100, 2)) == len(buf) * 2
+
+def test_null_speaker():
+    speaker = NullSpeaker()
+    speaker.play()
+    assert speaker.playing
+    speaker.stop()
+    assert not speaker.playing
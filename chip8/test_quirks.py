@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from chip8.quirks import (
+    DEFAULT_QUIRKS,
+    lookup,
+    parse_overrides,
+    resolve,
+)
+
+
+def test_lookup():
+    assert lookup(b'\x00\xE0') == DEFAULT_QUIRKS
+    with open('../roms/BLITZ', 'rb') as f:
+        assert not lookup(f.read()).wrap_sprites
+    assert lookup(b'\x00\xE0', {'shift_vy': True}).shift_vy
+
+def test_parse_overrides():
+    assert parse_overrides(None) == {}
+    assert parse_overrides(['shift_vy=1', 'wrap_sprites=0']) == {
+        'shift_vy': True,
+        'wrap_sprites': False,
+    }
+    with pytest.raises(ValueError):
+        parse_overrides(['unknown=1'])
+    with pytest.raises(ValueError):
+        parse_overrides(['shift_vy=yes'])
+
+def test_shift_vy():
+    handlers = resolve(DEFAULT_QUIRKS._replace(shift_vy=True))
+    v = bytearray(16)
+    v[1] = 0x81
+    handlers.shift_right(v, 0, 1)
+    assert v[0] == 0x40
+    assert v[0xF] == 1
+    handlers.shift_left(v, 0, 1)
+    assert v[0] == 0x02
+    assert v[0xF] == 1
+
+def test_load_store_i():
+    memory = bytearray(16)
+    v = bytearray(range(16))
+    handlers = resolve(DEFAULT_QUIRKS)
+    assert handlers.store_registers(memory, v, 4, 2) == 4
+    assert memory[4:7] == bytearray([0, 1, 2])
+    handlers = resolve(DEFAULT_QUIRKS._replace(load_store_i=True))
+    assert handlers.load_registers(memory, v, 4, 2) == 7
+    with pytest.raises(IndexError):
+        handlers.store_registers(memory, v, 15, 1)
+    assert len(memory) == 16
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import os
+
+import pygame
+
+from chip8.config import (
+    DISPLAY_WIDTH,
+    DISPLAY_HEIGHT,
+)
+from chip8.recorder import (
+    Recorder,
+    record,
+)
+
+
+def test_deduplicate(tmp_path):
+    path = str(tmp_path / 'frames')
+    recorder = Recorder(path)
+    blank = bytearray(DISPLAY_WIDTH * DISPLAY_HEIGHT)
+    dot = bytearray(blank)
+    dot[0] = 1
+    for frame in [blank, blank, blank, dot, blank, blank]:
+        recorder.capture(frame)
+    recorder.close()
+    with open(os.path.join(path, 'frames.txt')) as f:
+        durations = [int(line.split()[1]) for line in f]
+    assert durations == [3, 1, 2]
+    image = pygame.image.load(os.path.join(path, 'frame_00001.png'))
+    assert image.get_size() == (DISPLAY_WIDTH * 4, DISPLAY_HEIGHT * 4)
+    assert image.get_at((0, 0)) != image.get_at((4, 0))
+
+def test_record_gif(tmp_path):
+    path = str(tmp_path / 'MAZE.gif')
+    record('../roms/MAZE', path, 120, scale=2)
+    image = pygame.image.load(path)
+    assert image.get_size() == (DISPLAY_WIDTH * 2, DISPLAY_HEIGHT * 2)
+
+def test_record_png(tmp_path):
+    path = str(tmp_path / 'MAZE')
+    record('../roms/MAZE', path, 120)
+    with open(os.path.join(path, 'frames.txt')) as f:
+        durations = [int(line.split()[1]) for line in f]
+    assert sum(durations) == 120
+    assert len(durations) < 120
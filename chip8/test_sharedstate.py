@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+from multiprocessing import (
+    Pipe,
+    Process,
+)
+
+from chip8.config import FONTSET
+from chip8.peripherals import (
+    HeadlessDisplay,
+    VirtualKeyboard,
+)
+from chip8.sharedstate import (
+    SharedState,
+    SharedStateReader,
+)
+from chip8.vm import Chip8
+
+
+def read_frame(name, conn):
+    reader = SharedStateReader(name)
+    conn.send(reader.read())
+    reader.close()
+
+
+def test_shared_state():
+    chip8 = Chip8(HeadlessDisplay(), VirtualKeyboard())
+    shared = SharedState()
+    shared.attach(chip8)
+    try:
+        # Draw the "0" glyph at (0, 0), then jump to self
+        chip8.load(bytearray([0x60, 0x00, 0xF0, 0x29, 0xD0, 0x05, 0x12, 0x06]))
+        chip8.run_frame()
+        assert shared.seq == 2
+
+        parent, child = Pipe()
+        process = Process(target=read_frame, args=(shared.name, child))
+        process.start()
+        frame = parent.recv()
+        process.join()
+
+        assert frame.frame == 1
+        assert frame.pc == 0x206
+        assert frame.memory[:len(FONTSET)] == bytes(FONTSET)
+        assert frame.framebuffer[:4] == bytes([1, 1, 1, 1])
+        assert frame.framebuffer == bytes(chip8.display.frameBuffer)
+    finally:
+        shared.close()
+    # The VM keeps running on private copies
+    assert isinstance(chip8.memory, bytearray)
+    chip8.run_frame()
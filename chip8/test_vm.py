@@ -3,6 +3,7 @@
 import pytest
 
 from chip8.config import (
+    STACK_SIZE,
     PC_START,
     FONTSET_START,
     FONTSET_END,
@@ -10,11 +11,14 @@ from chip8.config import (
 )
 from chip8.peripherals import (
     Display,
+    HeadlessDisplay,
     Keyboard,
 )
 from chip8.vm import (
     Chip8,
     Instruction,
+    StackOverflowError,
+    StackUnderflowError,
 )
 
 display = Display()
@@ -102,7 +106,7 @@ def test_1nnn():
 def test_2nnn():
     pc_prev = chip8.pc
     chip8.execute(0x2123)
-    assert chip8.stack[-1] == pc_prev
+    assert chip8.stack[chip8.sp - 1] == pc_prev
     assert chip8.pc == 0x123
 
 
@@ -339,3 +343,48 @@ def test_Fx65():
     assert chip8.v[0x0] == 0x23
     assert chip8.v[0x1] == 0x45
     assert chip8.v[0x2] == 0x67
+
+
+def test_stack_overflow():
+    chip8.reset()
+    chip8.load(bytearray([0x22, 0x00]))
+    for _ in range(STACK_SIZE):
+        chip8.step()
+    assert chip8.sp == STACK_SIZE
+    with pytest.raises(StackOverflowError):
+        chip8.step()
+    assert chip8.pc == PC_START
+
+def test_stack_underflow():
+    chip8.reset()
+    chip8.load(bytearray([0x00, 0xEE]))
+    with pytest.raises(StackUnderflowError):
+        chip8.run_cycles(1)
+    assert chip8.pc == PC_START
+
+def test_run_cycles():
+    # V0 counts to 5 through a subroutine, then the program spins at 0x20A
+    rom_data = bytearray([
+        0x22, 0x0C,  # 200: CALL 20C
+        0x30, 0x05,  # 202: SE V0, 5
+        0x12, 0x00,  # 204: JP 200
+        0xA2, 0x10,  # 206: LD I, 210
+        0xF1, 0x55,  # 208: LD [I], V1
+        0x12, 0x0A,  # 20A: JP 20A
+        0x70, 0x01,  # 20C: ADD V0, 1
+        0x00, 0xEE,  # 20E: RET
+    ])
+    reference = Chip8(HeadlessDisplay(), keyboard)
+    reference.load(rom_data)
+    for _ in range(40):
+        reference.step()
+    chip8.reset()
+    chip8.load(rom_data)
+    chip8.run_cycles(15)
+    chip8.run_cycles(25)
+    assert chip8.pc == reference.pc == 0x20A
+    assert chip8.v == reference.v
+    assert chip8.v[0] == 5
+    assert chip8.i == reference.i
+    assert chip8.sp == reference.sp == 0
+    assert chip8.memory == reference.memory
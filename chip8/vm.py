@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 
+from array import array
+from collections import namedtuple
 from enum import (
     Enum,
     auto,
@@ -10,15 +12,22 @@ import time
 import pygame
 
 from config import (
-    CLOCK_SPEED,
     TIMER_SPEED,
+    CYCLES_PER_FRAME,
     MEMORY_SIZE,
     V_REGISTER_SIZE,
+    STACK_SIZE,
     PC_START,
     FONTSET_START,
     FONTSET_END,
     FONTSET,
 )
+from peripherals import NullSpeaker
+from quirks import (
+    DEFAULT_QUIRKS,
+    lookup,
+    resolve,
+)
 
 
 class Instruction(Enum):
@@ -60,12 +69,74 @@ class Instruction(Enum):
     UNKNOWN = auto()
 
 
+State = namedtuple('State', [
+    'memory',
+    'v',
+    'stack',
+    'sp',
+    'pc',
+    'i',
+    'delay_timer',
+    'sound_timer',
+    'framebuffer',
+])
+
+
+class UnknownInstructionError(Exception):
+    pass
+
+
+class MemoryAccessError(IndexError):
+    pass
+
+
+class StackOverflowError(Exception):
+    pass
+
+
+class StackUnderflowError(Exception):
+    pass
+
+
 class Chip8:
 
-    def __init__(self, display, keyboard):
+    __slots__ = (
+        'memory',
+        'v',
+        'delay_timer',
+        'sound_timer',
+        'i',
+        'pc',
+        'stack',
+        'sp',
+        'display',
+        'keyboard',
+        'speaker',
+        'trace',
+        'recorder',
+        'shared',
+        'quirks',
+        'shift_right',
+        'shift_left',
+        'store_registers',
+        'load_registers',
+        'draw_sprite',
+        'coverage',
+    )
+
+    def __init__(self, display, keyboard, speaker=None):
+        self.memory = bytearray(MEMORY_SIZE)
+        self.v = bytearray(V_REGISTER_SIZE)
+        self.stack = array('H', bytes(2 * STACK_SIZE))
+        self.shared = None
         self.reset()
         self.display = display
         self.keyboard = keyboard
+        self.speaker = speaker if speaker is not None else NullSpeaker()
+        self.trace = False
+        self.recorder = None
+        self.coverage = None
+        self.apply_quirks(DEFAULT_QUIRKS)
 
     def __str__(self):
         opcode = self.fetch()
@@ -75,24 +146,56 @@ class Chip8:
                                              for v in self.v))
         desc += 'I: {}\n'.format(hex(self.i))
         desc += 'STACK: [{}]'.format(', '.join('{}'.format(hex(v))
-                                               for v in self.stack))
+                                               for v in self.stack[:self.sp]))
         return desc
 
     # Initialize
 
     def reset(self):
-        self.memory = bytearray(MEMORY_SIZE)
-        self.v = bytearray(V_REGISTER_SIZE)
+        # memory and v are cleared in place, since they may be views into
+        # shared memory (see sharedstate.py)
+        self.memory[:] = bytes(MEMORY_SIZE)
+        self.v[:] = bytes(V_REGISTER_SIZE)
         self.delay_timer = 0
         self.sound_timer = 0
         self.i = 0
         self.pc = PC_START
-        self.stack = []
+        self.sp = 0
 
-    def load(self, rom_data):
+    def load(self, rom_data, quirks=None):
         self.init_memory()
         for i, val in enumerate(rom_data):
             self.memory[PC_START + i] = val
+        self.apply_quirks(quirks if quirks is not None else lookup(rom_data))
+
+    def apply_quirks(self, quirks):
+        self.quirks = quirks
+        handlers = resolve(quirks)
+        self.shift_right = handlers.shift_right
+        self.shift_left = handlers.shift_left
+        self.store_registers = handlers.store_registers
+        self.load_registers = handlers.load_registers
+        if quirks.wrap_sprites:
+            self.draw_sprite = self.display.draw_sprite_wrapped
+        else:
+            self.draw_sprite = self.display.draw_sprite
+
+    def snapshot(self):
+        return State(bytes(self.memory), bytes(self.v), array('H', self.stack),
+                     self.sp, self.pc, self.i, self.delay_timer,
+                     self.sound_timer, bytes(self.display.frameBuffer))
+
+    def restore(self, state):
+        # Copied into the existing buffers, which may be shared or viewed
+        self.memory[:] = state.memory
+        self.v[:] = state.v
+        self.stack[:] = state.stack
+        self.display.frameBuffer[:] = state.framebuffer
+        self.sp = state.sp
+        self.pc = state.pc
+        self.i = state.i
+        self.delay_timer = state.delay_timer
+        self.sound_timer = state.sound_timer
 
     def read_rom(self, rom):
         with open(rom, 'rb') as f:
@@ -195,8 +298,19 @@ class Chip8:
 
         return Instruction.UNKNOWN
 
+    def step(self):
+        if self.coverage is not None:
+            self.coverage[self.pc] = 1
+        try:
+            self.execute(self.fetch())
+        except IndexError as e:
+            if type(e) is not IndexError:
+                raise
+            raise MemoryAccessError(hex(self.pc)) from e
+
     def execute(self, opcode):
-        print(self.opcode_desc(opcode))
+        if self.trace:
+            print(self.opcode_desc(opcode))
 
         x = (opcode & 0x0F00) >> 8
         y = (opcode & 0x00F0) >> 4
@@ -209,8 +323,6 @@ class Chip8:
 
         key = self.keyboard.get_input()
 
-        start = time.time()
-
         if inst == Instruction.SYS:
             # 0nnn - SYS addr
             # Jump to a machine code routine at nnn.
@@ -229,7 +341,10 @@ class Chip8:
             #
             # The interpreter sets the program counter to the address at the
             # top of the stack, then subtracts 1 from the stack pointer.
-            self.pc = self.stack.pop()
+            if self.sp == 0:
+                raise StackUnderflowError(hex(self.pc))
+            self.sp -= 1
+            self.pc = self.stack[self.sp]
         elif inst == Instruction.JPAddr:
             # 1nnn - JP addr
             # Jump to location nnn.
@@ -243,7 +358,10 @@ class Chip8:
             #
             # The interpreter increments the stack pointer, then puts the
             # current PC on the top of the stack. The PC is then set to nnn.
-            self.stack.append(self.pc)
+            if self.sp == STACK_SIZE:
+                raise StackOverflowError(hex(self.pc))
+            self.stack[self.sp] = self.pc
+            self.sp += 1
             self.pc = nnn
             increment_pc = False
         elif inst == Instruction.SEVxByte:
@@ -339,8 +457,9 @@ class Chip8:
             #
             # If the least-significant bit of Vx is 1, then VF is set to 1,
             # otherwise 0. Then Vx is divided by 2.
-            self.v[0xF] = self.v[x] & 0x01
-            self.v[x] >>= 1
+            #
+            # With the shift_vy quirk, Vy is shifted and stored in Vx instead.
+            self.shift_right(self.v, x, y)
         elif inst == Instruction.SUBN:
             # 8xy7 - SUBN Vx, Vy
             # Set Vx = Vy - Vx, set VF = NOT borrow.
@@ -355,8 +474,9 @@ class Chip8:
             #
             # If the most-significant bit of Vx is 1, then VF is set to 1,
             # otherwise to 0. Then Vx is multiplied by 2.
-            self.v[0xF] = self.v[x] >> 7
-            self.v[x] = (self.v[x] << 1) & 0xFF
+            #
+            # With the shift_vy quirk, Vy is shifted and stored in Vx instead.
+            self.shift_left(self.v, x, y)
         elif inst == Instruction.SNEVxVy:
             # 9xy0 - SNE Vx, Vy
             # Skip next instruction if Vx != Vy.
@@ -400,8 +520,12 @@ class Chip8:
             # around to the opposite side of the screen. See instruction 8xy3
             # for more information on XOR, and section 2.4, Display, for more
             # information on the Chip-8 screen and sprites.
+            #
+            # Without the wrap_sprites quirk, sprites are clipped instead.
+            if self.i + n > MEMORY_SIZE:
+                raise MemoryAccessError(hex(self.i + n - 1))
             x, y, sprite = self.v[x], self.v[y], self.memory[self.i:self.i+n]
-            erased = self.display.draw_sprite(x, y, sprite)
+            erased = self.draw_sprite(x, y, sprite)
             self.v[0xF] = 1 if erased else 0
         elif inst == Instruction.SKP:
             # Ex9E - SKP Vx
@@ -480,18 +604,20 @@ class Chip8:
             #
             # The interpreter copies the values of registers V0 through Vx into
             # memory, starting at the address in I.
-            for i in range(x + 1):
-                self.memory[self.i + i] = self.v[i]
+            #
+            # With the load_store_i quirk, I is left at I + x + 1.
+            self.i = self.store_registers(self.memory, self.v, self.i, x)
         elif inst == Instruction.LDVxI:
             # Fx65 - LD Vx, [I]
             # Read registers V0 through Vx from memory starting at location I.
             #
             # The interpreter reads values from memory starting at location I
             # into registers V0 through Vx.
-            for i in range(x + 1):
-                self.v[i] = self.memory[self.i + i]
+            #
+            # With the load_store_i quirk, I is left at I + x + 1.
+            self.i = self.load_registers(self.memory, self.v, self.i, x)
         elif inst == Instruction.UNKNOWN:
-            raise Exception
+            raise UnknownInstructionError(hex(opcode))
         else:
             print(self)
             raise NotImplementedError(inst)
@@ -499,39 +625,211 @@ class Chip8:
         if increment_pc:
             self.pc += 2
 
-        end = time.time()
-        elapsed = end - start
-        if elapsed < CLOCK_SPEED:
-            pygame.time.wait(int((CLOCK_SPEED - elapsed) * 1000))
-
-    def run(self, rom):
+    def tick_timers(self):
+        if self.delay_timer > 0:
+            self.delay_timer -= 1
+        if self.sound_timer > 0:
+            self.speaker.play()
+            self.sound_timer -= 1
+            if self.sound_timer == 0:
+                self.speaker.stop()
+
+    def run_cycles(self, n):
+        # Same semantics as calling step() n times, but with the registers
+        # kept in locals for the whole batch and written back at the end. The
+        # keyboard is sampled once per batch.
+        if self.trace:
+            for _ in range(n):
+                self.step()
+            return
+
+        memory = self.memory
+        v = self.v
+        stack = self.stack
+        pc = cur = self.pc
+        i = self.i
+        sp = self.sp
+        dt = self.delay_timer
+        st = self.sound_timer
+        key = self.keyboard.get_input()
+        clear = self.display.clear
+        draw_sprite = self.draw_sprite
+        shift_right = self.shift_right
+        shift_left = self.shift_left
+        store_registers = self.store_registers
+        load_registers = self.load_registers
+        randint = random.randint
+        coverage = self.coverage
+
+        try:
+            for _ in range(n):
+                cur = pc
+                if coverage is not None:
+                    coverage[pc] = 1
+                opcode = memory[pc] << 8 | memory[pc + 1]
+                pc += 2
+                op = opcode >> 12
+                x = opcode >> 8 & 0xF
+
+                if op == 0x0:
+                    if opcode == 0x00E0:
+                        clear()
+                    elif opcode == 0x00EE:
+                        if sp == 0:
+                            raise StackUnderflowError(hex(cur))
+                        sp -= 1
+                        pc = stack[sp] + 2
+                    else:
+                        raise NotImplementedError(Instruction.SYS)
+                elif op == 0x1:
+                    pc = opcode & 0x0FFF
+                elif op == 0x2:
+                    if sp == STACK_SIZE:
+                        raise StackOverflowError(hex(cur))
+                    stack[sp] = cur
+                    sp += 1
+                    pc = opcode & 0x0FFF
+                elif op == 0x3:
+                    if v[x] == opcode & 0x00FF:
+                        pc += 2
+                elif op == 0x4:
+                    if v[x] != opcode & 0x00FF:
+                        pc += 2
+                elif op == 0x5:
+                    if v[x] == v[opcode >> 4 & 0xF]:
+                        pc += 2
+                elif op == 0x6:
+                    v[x] = opcode & 0x00FF
+                elif op == 0x7:
+                    v[x] = (v[x] + (opcode & 0x00FF)) & 0xFF
+                elif op == 0x8:
+                    y = opcode >> 4 & 0xF
+                    low = opcode & 0x000F
+                    if low == 0x0:
+                        v[x] = v[y]
+                    elif low == 0x1:
+                        v[x] |= v[y]
+                    elif low == 0x2:
+                        v[x] &= v[y]
+                    elif low == 0x3:
+                        v[x] ^= v[y]
+                    elif low == 0x4:
+                        v[0xF] = v[x] + v[y] > 0xFF
+                        v[x] = (v[x] + v[y]) & 0xFF
+                    elif low == 0x5:
+                        v[0xF] = v[x] > v[y]
+                        v[x] = (v[x] - v[y]) & 0xFF
+                    elif low == 0x6:
+                        shift_right(v, x, y)
+                    elif low == 0x7:
+                        v[0xF] = v[y] > v[x]
+                        v[x] = (v[y] - v[x]) & 0xFF
+                    elif low == 0xE:
+                        shift_left(v, x, y)
+                    else:
+                        raise UnknownInstructionError(hex(opcode))
+                elif op == 0x9:
+                    if v[x] != v[opcode >> 4 & 0xF]:
+                        pc += 2
+                elif op == 0xA:
+                    i = opcode & 0x0FFF
+                elif op == 0xB:
+                    pc = v[0] + (opcode & 0x0FFF)
+                elif op == 0xC:
+                    v[x] = randint(0x0, 0xFF) & opcode & 0x00FF
+                elif op == 0xD:
+                    if i + (opcode & 0x000F) > MEMORY_SIZE:
+                        raise MemoryAccessError(hex(i + (opcode & 0x000F) - 1))
+                    sprite = memory[i:i + (opcode & 0x000F)]
+                    erased = draw_sprite(v[x], v[opcode >> 4 & 0xF], sprite)
+                    v[0xF] = 1 if erased else 0
+                elif op == 0xE:
+                    kk = opcode & 0x00FF
+                    if kk == 0x9E:
+                        if key == v[x]:
+                            pc += 2
+                    elif kk == 0xA1:
+                        if key != v[x]:
+                            pc += 2
+                    else:
+                        raise UnknownInstructionError(hex(opcode))
+                else:
+                    kk = opcode & 0x00FF
+                    if kk == 0x07:
+                        v[x] = dt
+                    elif kk == 0x0A:
+                        if key:
+                            v[x] = key
+                        else:
+                            pc = cur
+                    elif kk == 0x15:
+                        dt = v[x]
+                    elif kk == 0x18:
+                        st = v[x]
+                    elif kk == 0x1E:
+                        i += v[x]
+                    elif kk == 0x29:
+                        i = FONTSET_START + v[x] * 5
+                    elif kk == 0x33:
+                        memory[i] = v[x] // 100
+                        memory[i + 1] = (v[x] // 10) % 10
+                        memory[i + 2] = v[x] % 10
+                    elif kk == 0x55:
+                        i = store_registers(memory, v, i, x)
+                    elif kk == 0x65:
+                        i = load_registers(memory, v, i, x)
+                    else:
+                        raise UnknownInstructionError(hex(opcode))
+        except BaseException as e:
+            # Leave PC at the faulting instruction, as step() does
+            pc = cur
+            if type(e) is IndexError:
+                raise MemoryAccessError(hex(cur)) from e
+            raise
+        finally:
+            self.pc = pc
+            self.i = i
+            self.sp = sp
+            self.delay_timer = dt
+            self.sound_timer = st
+
+    def run_frame(self, cycles=CYCLES_PER_FRAME):
+        # Run one 60Hz frame worth of instructions without any pacing, for
+        # callers that schedule frames themselves.
+        if self.shared is not None:
+            self.shared.begin_write()
+        self.run_cycles(cycles)
+        self.tick_timers()
+        if self.shared is not None:
+            self.shared.end_write(self)
+
+    def present(self):
+        self.display.update()
+        if self.recorder is not None:
+            self.recorder.capture(self.display.frameBuffer)
+
+    def run(self, rom, quirk_overrides=None):
         rom_data = self.read_rom(rom)
-        self.load(rom_data)
+        self.load(rom_data, lookup(rom_data, quirk_overrides))
         running = True
-        counter = time.time()
 
         while running:
-            # Fetch
-            opcode = self.fetch()
-            # Decode and execute
-            self.execute(opcode)
-            # Update timers
-            if time.time() - counter > TIMER_SPEED:
-                if self.delay_timer > 0:
-                    self.delay_timer -= 1
-                if self.sound_timer > 0:
-                    if self.sound_timer == 1:
-                        self.display.playBeep()
-                    self.sound_timer -= 1
-                counter = time.time()
-
-                self.display.update()
+            start = time.time()
+            # Fetch, decode and execute a frame worth of instructions, then
+            # update timers
+            self.run_frame()
+            self.present()
 
             # Exit if the close buttun is pressed
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
 
+            elapsed = time.time() - start
+            if elapsed < TIMER_SPEED:
+                pygame.time.wait(int((TIMER_SPEED - elapsed) * 1000))
+
+        self.speaker.stop()
         pygame.quit()
 
     def opcode_desc(self, opcode):